@@ -0,0 +1,44 @@
+# app/api/v1/endpoints/admin.py
+import secrets
+from fastapi import APIRouter, Depends, HTTPException, Header, status
+from fastapi.responses import HTMLResponse, PlainTextResponse
+from typing import List, Dict, Any, Optional
+from app.core.config import settings
+from app.core import profiling
+
+router = APIRouter()
+
+# --- Admin Access ---
+async def require_admin_token(x_admin_token: Optional[str] = Header(None)):
+    """Allows the request only if ADMIN_TOKEN is configured and matches the X-Admin-Token header."""
+    if not settings.ADMIN_TOKEN:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Admin endpoints are disabled")
+    if not secrets.compare_digest(x_admin_token or "", settings.ADMIN_TOKEN):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Invalid admin token")
+
+# --- Profiling Endpoints ---
+@router.get("/profiles", dependencies=[Depends(require_admin_token)])
+async def list_profiles() -> List[Dict[str, Any]]:
+    """Lists the most recent sampled request profiles, newest first."""
+    return [
+        {k: v for k, v in entry.items() if k != "profiler"}
+        for entry in reversed(profiling.recent_profiles)
+    ]
+
+@router.get("/profiles/{profile_id}", dependencies=[Depends(require_admin_token)])
+async def get_profile(profile_id: str, format: str = "html"):
+    """
+    Renders a stored profile: `html` is pyinstrument's interactive flamegraph/timeline,
+    `text` is the call tree.
+    """
+    entry = next((p for p in profiling.recent_profiles if p["id"] == profile_id), None)
+    if entry is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Profile not found (it may have been evicted)")
+    if format == "text":
+        return PlainTextResponse(entry["profiler"].output_text(unicode=True, color=False))
+    return HTMLResponse(entry["profiler"].output_html())
+
+@router.get("/slow-requests", dependencies=[Depends(require_admin_token)])
+async def list_slow_requests() -> List[Dict[str, Any]]:
+    """Lists requests and background analyses slower than SLOW_REQUEST_THRESHOLD_SECONDS, newest first."""
+    return list(reversed(profiling.slow_captures))
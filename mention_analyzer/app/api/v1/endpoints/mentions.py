@@ -1,18 +1,27 @@
 # app/api/v1/endpoints/mentions.py
-from fastapi import APIRouter, Depends, HTTPException, status, BackgroundTasks
+from fastapi import APIRouter, Depends, HTTPException, status, Header, Response, Query
 from sqlalchemy.ext.asyncio import AsyncSession
-from typing import List, Dict, Any # Ensure List is imported for the response model
+from sqlalchemy.exc import IntegrityError
+from typing import List, Dict, Any, Optional # Ensure List is imported for the response model
 
 # Import the factory and dependency function for DB sessions
 from app.db.database import get_db_session, AsyncSessionLocal
 # Import CRUD functions for database operations
 from app.db.crud import mentions as crud_mentions
 # Import Pydantic models used for API requests/responses and domain logic
-from app.models.domain.mentions import MentionCreate, MentionRecord, MentionAnalysis, ProcessingStatus, MentionSummary
+from app.models.domain.mentions import MentionCreate, MentionRecord, MentionAnalysis, ProcessingStatus, MentionSummary, TopicCluster
 # Import the service performing the LLM analysis
 from app.services import llm_analyzer
+# Import the prioritised analysis queue and its admission control
+from app.services.analysis_queue import analysis_queue, classify_priority, AnalysisJob, QueueFullError
+# Import the incremental topic clusterer for emerging-issue detection
+from app.services.topic_clustering import topic_clusterer
+# Import idempotency helpers for deduplicating retried submissions
+from app.services.idempotency import idempotency_cache, derive_idempotency_key
 # Import logger
-from app.core.config import logger
+from app.core.config import settings, logger
+# Import span timing helpers for the profiling instrumentation
+from app.core.profiling import span, capture
 import uuid
 import traceback
 import asyncio # Needed if using asyncio.to_thread for sync LLM calls
@@ -21,7 +30,7 @@ import asyncio # Needed if using asyncio.to_thread for sync LLM calls
 router = APIRouter()
 
 # --- Background Task Function ---
-# This function runs the analysis in the background.
+# This function runs the analysis in the background (called by the analysis queue workers).
 # It needs to manage its own database session.
 async def run_analysis_background(mention_id: uuid.UUID, mention_text: str):
     """
@@ -29,6 +38,11 @@ async def run_analysis_background(mention_id: uuid.UUID, mention_text: str):
     Handles database session, status updates, LLM call, and error logging.
     """
     logger.info(f"Background task started for mention_id: {mention_id}")
+    # Collect span timings so slow analyses are captured like slow requests
+    with capture(f"analysis {mention_id}", threshold=settings.SLOW_ANALYSIS_THRESHOLD_SECONDS):
+        await _run_analysis(mention_id, mention_text)
+
+async def _run_analysis(mention_id: uuid.UUID, mention_text: str):
     # Create a new database session specifically for this background task
     async with AsyncSessionLocal() as db: # Get a new session using the factory
         try:
@@ -61,6 +75,13 @@ async def run_analysis_background(mention_id: uuid.UUID, mention_text: str):
             await db.commit() # Commit final results
             logger.info(f"Successfully processed and stored analysis for mention {mention_id} (background task).")
 
+            # 4. Feed the completed mention into the emerging-topic clusters (never fails the analysis)
+            try:
+                with span("clustering.add"):
+                    topic_clusterer.add(mention_id, mention_text, analysis_result)
+            except Exception as cluster_err:
+                logger.error(f"Topic clustering failed for mention {mention_id}: {cluster_err}", exc_info=True)
+
         except Exception as e:
             # Handle errors during the background task
             logger.error(f"Background task failed for mention_id {mention_id}: {e}", exc_info=True)
@@ -76,6 +97,15 @@ async def run_analysis_background(mention_id: uuid.UUID, mention_text: str):
             except Exception as db_err:
                  logger.critical(f"CRITICAL: Failed to update mention {mention_id} status to FAILED in background task: {db_err}")
 
+async def reset_mention_to_pending(mention_id: uuid.UUID):
+    """
+    Hands a mention whose analysis was cancelled (e.g. at shutdown) back to PENDING,
+    so it is re-queued on the next startup instead of staying PROCESSING forever.
+    """
+    async with AsyncSessionLocal() as db:
+        await crud_mentions.update_mention_status(db, mention_id, ProcessingStatus.PENDING)
+        await db.commit()
+
 # --- API Endpoint to List Mentions ---
 # Handles GET requests to /api/v1/mentions/
 @router.get("/", response_model=List[MentionRecord]) # Ensure this uses @router.get("/")
@@ -104,7 +134,8 @@ async def list_mentions(
             "analysis_result": db_mention_orm.analysis_result if isinstance(db_mention_orm.analysis_result, dict) else None,
             "error_message": db_mention_orm.error_message,
         }
-         response_data.append(MentionRecord.model_validate(mention_data_dict))
+         with span("pydantic.validate"):
+             response_data.append(MentionRecord.model_validate(mention_data_dict))
 
     return response_data
 
@@ -113,35 +144,84 @@ async def list_mentions(
 @router.post("/", response_model=MentionRecord, status_code=status.HTTP_202_ACCEPTED)
 async def submit_mention_for_analysis(
     mention_in: MentionCreate,
-    background_tasks: BackgroundTasks,
+    response: Response,
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
     db: AsyncSession = Depends(get_db_session)
 ):
     """
-    Accepts a new mention via POST request. Saves it and schedules background analysis.
+    Accepts a new mention via POST request. Saves it and queues it for background analysis
+    by priority. Responds 429 with Retry-After if the analysis queue is over its limits.
+
+    Submissions are idempotent when an `Idempotency-Key` header or `metadata.external_id`
+    is given: a repeat returns the existing mention and its current status (200) instead
+    of inserting and analysing it again.
     """
     logger.info(f"Received mention submission: source='{mention_in.source}', text='{mention_in.text[:50]}...'")
+    idempotency_key = derive_idempotency_key(mention_in, idempotency_key)
+
+    # Recently seen keys are answered from the in-memory cache; new keys go straight
+    # to the insert and rely on the unique index, so the happy path costs no extra query
+    cached_id = idempotency_cache.get(idempotency_key) if idempotency_key else None
+    if cached_id is not None:
+        db_mention_orm = await crud_mentions.get_mention(db, mention_id=cached_id)
+        if db_mention_orm is not None:
+            logger.info(f"Duplicate submission for key '{idempotency_key}', returning mention {cached_id}")
+            response.status_code = status.HTTP_200_OK
+            return _to_mention_record(db_mention_orm)
+
+    priority = classify_priority(mention_in)
     try:
-        db_mention_orm = await crud_mentions.create_mention(db=db, mention=mention_in)
+        analysis_queue.check_admission(mention_in.source, priority)
+    except QueueFullError as e:
+        # A retry of an already accepted mention isn't new work: return it rather than 429,
+        # even if its key fell out of (or never reached) this process's cache
+        if idempotency_key:
+            existing = await crud_mentions.get_mention_by_idempotency_key(db, idempotency_key)
+            if existing is not None:
+                idempotency_cache.put(idempotency_key, existing.id)
+                logger.info(f"Duplicate submission for key '{idempotency_key}', returning mention {existing.id}")
+                response.status_code = status.HTTP_200_OK
+                return _to_mention_record(existing)
+        logger.warning(f"Rejected mention (priority={priority.value}): {e.reason}")
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=e.reason,
+            headers={"Retry-After": str(e.retry_after)}
+        )
+
+    try:
+        db_mention_orm = await crud_mentions.create_mention(db=db, mention=mention_in, idempotency_key=idempotency_key)
         await db.commit()
         await db.refresh(db_mention_orm)
         logger.info(f"Mention saved to DB with ID: {db_mention_orm.id} and status: {db_mention_orm.status}")
+        if idempotency_key:
+            idempotency_cache.put(idempotency_key, db_mention_orm.id)
 
-        background_tasks.add_task(run_analysis_background, db_mention_orm.id, db_mention_orm.text)
-        logger.info(f"Scheduled background analysis task for mention ID: {db_mention_orm.id}")
+        await analysis_queue.put(AnalysisJob(
+            mention_id=db_mention_orm.id,
+            text=db_mention_orm.text,
+            source=mention_in.source or "unknown",
+            priority=priority
+        ))
+        logger.info(f"Queued background analysis for mention ID: {db_mention_orm.id} (priority={priority.value})")
 
-        mention_data_dict = {
-            "id": db_mention_orm.id,
-            "text": db_mention_orm.text,
-            "source": db_mention_orm.source,
-            "metadata": db_mention_orm.metadata_ if isinstance(db_mention_orm.metadata_, dict) else None,
-            "created_at": db_mention_orm.created_at,
-            "updated_at": db_mention_orm.updated_at,
-            "status": db_mention_orm.status,
-            "analysis_result": db_mention_orm.analysis_result if isinstance(db_mention_orm.analysis_result, dict) else None,
-            "error_message": db_mention_orm.error_message,
-        }
-        response_data = MentionRecord.model_validate(mention_data_dict)
-        return response_data
+        return _to_mention_record(db_mention_orm)
+
+    except IntegrityError:
+        # Unique index on idempotency_key hit: a previous submission (e.g. before a
+        # restart or from another worker process) already created this mention
+        await db.rollback()
+        existing = await crud_mentions.get_mention_by_idempotency_key(db, idempotency_key) if idempotency_key else None
+        if existing is None:
+            logger.error("Integrity error saving mention without a matching idempotency key", exc_info=True)
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail="Failed to initiate mention analysis process."
+            )
+        idempotency_cache.put(idempotency_key, existing.id)
+        logger.info(f"Duplicate submission for key '{idempotency_key}', returning mention {existing.id}")
+        response.status_code = status.HTTP_200_OK
+        return _to_mention_record(existing)
 
     except Exception as e:
         logger.error(f"Failed to submit mention for analysis: {e}", exc_info=True)
@@ -151,6 +231,22 @@ async def submit_mention_for_analysis(
             detail="Failed to initiate mention analysis process."
         )
 
+def _to_mention_record(db_mention_orm) -> MentionRecord:
+    """Validates a MentionDB row into the API response model."""
+    mention_data_dict = {
+        "id": db_mention_orm.id,
+        "text": db_mention_orm.text,
+        "source": db_mention_orm.source,
+        "metadata": db_mention_orm.metadata_ if isinstance(db_mention_orm.metadata_, dict) else None,
+        "created_at": db_mention_orm.created_at,
+        "updated_at": db_mention_orm.updated_at,
+        "status": db_mention_orm.status,
+        "analysis_result": db_mention_orm.analysis_result if isinstance(db_mention_orm.analysis_result, dict) else None,
+        "error_message": db_mention_orm.error_message,
+    }
+    with span("pydantic.validate"):
+        return MentionRecord.model_validate(mention_data_dict)
+
 
 
 # --- API Endpoint for Summary Statistics ---
@@ -169,6 +265,18 @@ async def get_summary(
     return summary_data
 # --- END OF ENDPOINT TO ADD ---
 
+# --- API Endpoint for Emerging Topic Clusters ---
+@router.get("/clusters", response_model=List[TopicCluster])
+async def get_emerging_clusters(
+    limit: int = Query(10, ge=1, le=100),
+    min_size: Optional[int] = Query(None, ge=1)
+):
+    """
+    Retrieves the fastest-growing topic clusters of completed mentions, with
+    representative mentions, so one incident shows up as one cluster.
+    """
+    return topic_clusterer.top_emerging(limit=limit, min_size=min_size)
+
 # --- API Endpoint to Get Specific Mention Status ---
 # Handles GET requests to /api/v1/mentions/{mention_id}
 @router.get("/{mention_id}", response_model=MentionRecord)
@@ -200,6 +308,7 @@ async def get_mention_status(
         "analysis_result": db_mention_orm.analysis_result if isinstance(db_mention_orm.analysis_result, dict) else None,
         "error_message": db_mention_orm.error_message,
     }
-    response_data = MentionRecord.model_validate(mention_data_dict)
+    with span("pydantic.validate"):
+        response_data = MentionRecord.model_validate(mention_data_dict)
     return response_data
 
@@ -0,0 +1,127 @@
+# app/core/profiling.py
+import time
+import uuid
+import random
+import secrets
+import datetime
+import contextvars
+from collections import deque, defaultdict
+from contextlib import contextmanager
+from starlette.middleware.base import BaseHTTPMiddleware
+from app.core.config import settings, logger
+
+try:
+    from pyinstrument import Profiler # Optional: sampling profiler for on-demand request profiles
+except ImportError:
+    Profiler = None
+
+# Header that forces a profile for a single request; its value must equal ADMIN_TOKEN
+DEBUG_PROFILE_HEADER = "X-Debug-Profile"
+
+# Most recent profiles and slow requests/jobs, newest last
+recent_profiles: deque = deque(maxlen=settings.PROFILING_BUFFER_SIZE)
+slow_captures: deque = deque(maxlen=settings.SLOW_REQUEST_BUFFER_SIZE)
+
+# Span totals for the request/job currently running in this context (None when not capturing)
+_current_spans: contextvars.ContextVar[dict | None] = contextvars.ContextVar("current_spans", default=None)
+
+
+@contextmanager
+def span(name: str):
+    """
+    Times a hot section and adds it to the current request's span breakdown.
+    A no-op outside of a capture(), so it's safe to leave in library code.
+    """
+    spans = _current_spans.get()
+    if spans is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        entry = spans[name]
+        entry["count"] += 1
+        entry["total_ms"] += (time.perf_counter() - started) * 1000
+
+
+@contextmanager
+def capture(name: str, profile_id: str | None = None, threshold: float | None = None):
+    """
+    Collects spans for one request or background job. If it runs longer than
+    threshold (default SLOW_REQUEST_THRESHOLD_SECONDS) it's stored in slow_captures with its span breakdown.
+    A no-op unless PROFILING_ENABLED is set.
+    """
+    if not settings.PROFILING_ENABLED:
+        yield
+        return
+    spans = defaultdict(lambda: {"count": 0, "total_ms": 0.0})
+    token = _current_spans.set(spans)
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        _current_spans.reset(token)
+        duration = time.perf_counter() - started
+        if duration >= (threshold if threshold is not None else settings.SLOW_REQUEST_THRESHOLD_SECONDS):
+            breakdown = {k: {"count": v["count"], "total_ms": round(v["total_ms"], 2)} for k, v in spans.items()}
+            slow_captures.append({
+                "name": name,
+                "duration_ms": round(duration * 1000, 2),
+                "captured_at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+                "profile_id": profile_id,
+                "spans": breakdown,
+            })
+            logger.warning(f"Slow {name}: {duration * 1000:.0f}ms, spans={breakdown}")
+
+
+class ProfilingMiddleware(BaseHTTPMiddleware):
+    """
+    Opt-in (PROFILING_ENABLED) request instrumentation.
+
+    Every request gets span collection and slow-request capture. A random
+    PROFILING_SAMPLE_RATE fraction of requests, plus any carrying a valid
+    X-Debug-Profile header, also run under the pyinstrument sampling profiler;
+    the latest results are kept in recent_profiles for the admin endpoints.
+    """
+
+    _active = False # One profile at a time keeps the overhead bounded
+
+    def _should_profile(self, request) -> bool:
+        if Profiler is None or ProfilingMiddleware._active:
+            return False
+        header = request.headers.get(DEBUG_PROFILE_HEADER)
+        if header and settings.ADMIN_TOKEN and secrets.compare_digest(header, settings.ADMIN_TOKEN):
+            return True
+        return random.random() < settings.PROFILING_SAMPLE_RATE
+
+    async def dispatch(self, request, call_next):
+        name = f"{request.method} {request.url.path}"
+        if not self._should_profile(request):
+            with capture(name):
+                return await call_next(request)
+
+        profile_id = uuid.uuid4().hex
+        profiler = Profiler(interval=settings.PROFILING_INTERVAL, async_mode="enabled")
+        started = time.perf_counter()
+        ProfilingMiddleware._active = True
+        with capture(name, profile_id=profile_id):
+            profiler.start()
+            try:
+                response = await call_next(request)
+            finally:
+                profiler.stop()
+                ProfilingMiddleware._active = False
+        recent_profiles.append({
+            "id": profile_id,
+            "name": name,
+            "duration_ms": round((time.perf_counter() - started) * 1000, 2),
+            "captured_at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            "profiler": profiler, # Rendered on demand by the admin endpoints
+        })
+        response.headers["X-Profile-Id"] = profile_id
+        return response
+
+
+if settings.PROFILING_ENABLED and Profiler is None:
+    logger.warning("PROFILING_ENABLED is set but pyinstrument isn't installed; only spans and slow requests are captured.")
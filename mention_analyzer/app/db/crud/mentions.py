@@ -6,14 +6,16 @@ from sqlalchemy import select, desc, update, func, case
 from app.models.db.mentions import MentionDB
 from app.models.domain.mentions import MentionCreate, MentionAnalysis, ProcessingStatus
 from app.core.config import logger
+from app.core.profiling import span
 import datetime
 
-async def create_mention(db: AsyncSession, mention: MentionCreate) -> MentionDB:
+async def create_mention(db: AsyncSession, mention: MentionCreate, idempotency_key: str | None = None) -> MentionDB:
     """Creates a new mention record in the database."""
     db_mention = MentionDB(
         text=mention.text,
         source=mention.source,
         metadata_=mention.metadata, # Map to db column name
+        idempotency_key=idempotency_key, # Unique index rejects duplicate submissions on commit
         status=ProcessingStatus.PENDING
     )
     db.add(db_mention)
@@ -25,7 +27,14 @@ async def create_mention(db: AsyncSession, mention: MentionCreate) -> MentionDB:
 
 async def get_mention(db: AsyncSession, mention_id: uuid.UUID) -> MentionDB | None:
     """Retrieves a mention by its ID."""
-    result = await db.execute(select(MentionDB).filter(MentionDB.id == mention_id))
+    with span("db.execute"):
+        result = await db.execute(select(MentionDB).filter(MentionDB.id == mention_id))
+    return result.scalars().first()
+
+async def get_mention_by_idempotency_key(db: AsyncSession, idempotency_key: str) -> MentionDB | None:
+    """Retrieves the mention previously submitted with the given idempotency key."""
+    with span("db.execute"):
+        result = await db.execute(select(MentionDB).filter(MentionDB.idempotency_key == idempotency_key))
     return result.scalars().first()
 
 async def update_mention_status(db: AsyncSession, mention_id: uuid.UUID, status: ProcessingStatus, error_message: str | None = None):
@@ -41,7 +50,8 @@ async def update_mention_status(db: AsyncSession, mention_id: uuid.UUID, status:
          )
         # .execution_options(synchronize_session="fetch") # May be needed depending on SQLAlchemy version/context
     )
-    await db.execute(stmt)
+    with span("db.execute"):
+        await db.execute(stmt)
     # Commit handled by the background task function itself
 
 async def update_mention_analysis(db: AsyncSession, mention_id: uuid.UUID, analysis_data: MentionAnalysis, status: ProcessingStatus):
@@ -62,7 +72,8 @@ async def update_mention_analysis(db: AsyncSession, mention_id: uuid.UUID, analy
         )
         # .execution_options(synchronize_session="fetch")
     )
-    await db.execute(stmt)
+    with span("db.execute"):
+        await db.execute(stmt)
      # Commit handled by the background task function itself
 
 
@@ -79,12 +90,13 @@ async def get_mentions(db: AsyncSession, skip: int = 0, limit: int = 100) -> lis
     Returns:
         A list of MentionDB ORM objects.
     """
-    result = await db.execute(
-        select(MentionDB)
-        .order_by(desc(MentionDB.created_at)) # Order by creation date, newest first
-        .offset(skip)
-        .limit(limit)
-    )
+    with span("db.execute"):
+        result = await db.execute(
+            select(MentionDB)
+            .order_by(desc(MentionDB.created_at)) # Order by creation date, newest first
+            .offset(skip)
+            .limit(limit)
+        )
     return result.scalars().all()
 # --- END OF FUNCTION TO ADD ---
 
@@ -107,7 +119,8 @@ async def get_mention_summary(db: AsyncSession) -> dict:
         )
         .group_by(MentionDB.status)
     )
-    status_result = await db.execute(status_query)
+    with span("db.execute"):
+        status_result = await db.execute(status_query)
     status_counts = {row.status.value: row.count for row in status_result.all()}
 
     # Query for counts per sentiment (only for 'completed' mentions)
@@ -124,11 +137,13 @@ async def get_mention_summary(db: AsyncSession) -> dict:
         .group_by(func.json_extract(MentionDB.analysis_result, '$.sentiment'))
     )
 
-    sentiment_result = await db.execute(sentiment_query)
+    with span("db.execute"):
+        sentiment_result = await db.execute(sentiment_query)
     sentiment_counts = {row.sentiment: row.count for row in sentiment_result.all()}
 
     # Get total count
-    total_count_result = await db.execute(select(func.count(MentionDB.id)))
+    with span("db.execute"):
+        total_count_result = await db.execute(select(func.count(MentionDB.id)))
     total_count = total_count_result.scalar_one_or_none() or 0
 
     summary = {
@@ -144,4 +159,31 @@ async def get_mention_summary(db: AsyncSession) -> dict:
     return summary
 # --- END OF FUNCTION TO ADD ---
 
+async def get_unfinished_mentions(db: AsyncSession, stale_before: datetime.datetime) -> list[MentionDB]:
+    """
+    Retrieves mentions left unanalysed by a previous run: all PENDING ones, plus PROCESSING
+    ones last updated before stale_before. Oldest first.
+    """
+    with span("db.execute"):
+        result = await db.execute(
+            select(MentionDB)
+            .where(
+                (MentionDB.status == ProcessingStatus.PENDING)
+                | ((MentionDB.status == ProcessingStatus.PROCESSING) & (MentionDB.updated_at < stale_before))
+            )
+            .order_by(MentionDB.created_at)
+        )
+    return result.scalars().all()
+
+async def get_recent_completed_mentions(db: AsyncSession, limit: int = 2000) -> list[MentionDB]:
+    """Retrieves the most recently completed mentions, newest first (used to warm topic clusters)."""
+    with span("db.execute"):
+        result = await db.execute(
+            select(MentionDB)
+            .where(MentionDB.status == ProcessingStatus.COMPLETED)
+            .order_by(desc(MentionDB.updated_at))
+            .limit(limit)
+        )
+    return result.scalars().all()
+
 # ... rest of the CRUD functions ...
\ No newline at end of file
@@ -1,6 +1,7 @@
 # app/db/database.py
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy import inspect, text
 from app.core.config import settings
 import logging
 
@@ -37,4 +38,14 @@ async def init_db():
     async with engine.begin() as conn:
         # await conn.run_sync(Base.metadata.drop_all) # Uncomment to drop tables on startup
         await conn.run_sync(Base.metadata.create_all)
-    logger.info("Database tables created (if they didn't exist).")
\ No newline at end of file
+        # create_all doesn't add columns to existing tables, so migrate older databases in place
+        await conn.run_sync(_add_idempotency_key_column)
+    logger.info("Database tables created (if they didn't exist).")
+
+def _add_idempotency_key_column(sync_conn):
+    """Adds mentions.idempotency_key and its unique index to databases created before it existed (idempotent)."""
+    columns = {column["name"] for column in inspect(sync_conn).get_columns("mentions")}
+    if "idempotency_key" not in columns:
+        sync_conn.execute(text("ALTER TABLE mentions ADD COLUMN idempotency_key VARCHAR"))
+        logger.info("Added mentions.idempotency_key column.")
+    sync_conn.execute(text("CREATE UNIQUE INDEX IF NOT EXISTS ix_mentions_idempotency_key ON mentions (idempotency_key)"))
\ No newline at end of file
@@ -5,8 +5,11 @@ from app.core.config import settings, logger
 # --- Import CORS Middleware ---
 from starlette.middleware.cors import CORSMiddleware
 
-from app.api.v1.endpoints import mentions # Import your router
-from app.db.database import init_db # Import DB init function
+from app.api.v1.endpoints import mentions, admin # Import your routers
+from app.core.profiling import ProfilingMiddleware
+from app.db.database import init_db, AsyncSessionLocal # Import DB init function
+from app.services import topic_clustering
+from app.services.analysis_queue import analysis_queue, requeue_unfinished
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
@@ -14,9 +17,15 @@ async def lifespan(app: FastAPI):
     logger.info("Application startup...")
     await init_db() # Initialize the database (create tables)
     logger.info("Database initialized.")
+    async with AsyncSessionLocal() as db:
+        await topic_clustering.warm_start(db, topic_clustering.topic_clusterer) # Rebuild emerging-topic clusters
+        await requeue_unfinished(db, analysis_queue) # Mentions left pending/processing by the last run
+    # Workers draining the priority queue; a cancelled analysis is reset to pending
+    analysis_queue.start(mentions.run_analysis_background, on_cancel=mentions.reset_mention_to_pending)
     yield
     # Actions on shutdown
     logger.info("Application shutdown...")
+    await analysis_queue.stop() # Drains in-flight analyses before cancelling
 
 app = FastAPI(
     title=settings.PROJECT_NAME,
@@ -43,8 +52,12 @@ app.add_middleware(
     allow_headers=["*"], # Allow all headers
 )
 # --- End CORS Middleware ---
+# Opt-in profiling: span timings, slow-request capture and sampled profiles (see /api/v1/admin)
+if settings.PROFILING_ENABLED:
+    app.add_middleware(ProfilingMiddleware)
 # Include your API router
 app.include_router(mentions.router, prefix=settings.API_V1_STR + "/mentions", tags=["mentions"])
+app.include_router(admin.router, prefix=settings.API_V1_STR + "/admin", tags=["admin"])
 
 @app.get("/")
 async def read_root():
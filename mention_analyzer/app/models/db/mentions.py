@@ -15,6 +15,9 @@ class MentionDB(Base):
     source = Column(String, nullable=True)
     metadata_ = Column("metadata", JSON, nullable=True) # Use 'metadata_' to avoid keyword conflict
 
+    # Dedup key from the Idempotency-Key header or (source, metadata.external_id); NULLs don't collide
+    idempotency_key = Column(String, nullable=True, unique=True, index=True)
+
     created_at = Column(DateTime(timezone=True), default=lambda: datetime.datetime.now(datetime.timezone.utc))
     updated_at = Column(DateTime(timezone=True), default=lambda: datetime.datetime.now(datetime.timezone.utc), onupdate=lambda: datetime.datetime.now(datetime.timezone.utc))
 
@@ -25,6 +25,11 @@ class ProcessingStatus(str, Enum):
     COMPLETED = "completed"
     FAILED = "failed"
 
+class MentionPriority(str, Enum):
+    HIGH = "high"
+    NORMAL = "normal"
+    LOW = "low"
+
 class MentionRecord(MentionCreate):
     id: uuid.UUID = Field(default_factory=uuid.uuid4)
     # --- CORRECT THESE LINES ---
@@ -43,4 +48,21 @@ class MentionSummary(BaseModel):
     total_mentions: int
     by_status: Dict[str, int] # Explicitly define nested dict structure
     by_sentiment: Dict[str, int]
-# --- END OF MODEL TO ADD ---
\ No newline at end of file
+# --- END OF MODEL TO ADD ---
+
+class ClusterMention(BaseModel):
+    id: uuid.UUID
+    text: str
+    similarity: float # Cosine similarity to the cluster centroid when assigned
+
+class TopicCluster(BaseModel):
+    id: int
+    size: int
+    recent_rate_per_hour: float
+    baseline_rate_per_hour: float
+    growth: float # recent / baseline rate; well above 1 means the topic is emerging
+    top_terms: List[str]
+    by_sentiment: Dict[str, int]
+    first_seen: datetime.datetime
+    last_seen: datetime.datetime
+    representative_mentions: List[ClusterMention]
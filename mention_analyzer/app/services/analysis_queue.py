@@ -0,0 +1,265 @@
+# app/services/analysis_queue.py
+import re
+import math
+import time
+import asyncio
+import uuid
+import datetime
+from collections import deque, Counter
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.config import settings, logger
+from app.db.crud import mentions as crud_mentions
+from app.models.domain.mentions import MentionCreate, MentionPriority
+
+# Cheap urgency signals: outage/incident wording, or shouting
+# Terms like "down" and "error" only count in outage phrasing ("site down", "error 502"),
+# so "Down to try the new app" or "error-free" don't get bumped
+URGENT_PATTERN = re.compile(
+    r"\b((is|was|went|goes|site|website|app|server|service)\s+(is\s+)?down|outage|not working|"
+    r"crash(es|ed|ing)?|can'?t (log ?in|login|access|pay)|error (code|\d+)|getting (an? )?errors?\b|"
+    r"hacked|scam|fraud|charged twice|data (loss|leak)|urgent|asap)\b",
+    re.IGNORECASE,
+)
+
+_PRIORITY_ORDER = [MentionPriority.LOW, MentionPriority.NORMAL, MentionPriority.HIGH]
+
+# Share of ANALYSIS_MAX_QUEUE_DEPTH each class may fill, so urgent mentions keep headroom in a spike
+_ADMISSION_SHARE = {MentionPriority.HIGH: 1.0, MentionPriority.NORMAL: 0.8, MentionPriority.LOW: 0.5}
+
+
+def is_urgent(text: str) -> bool:
+    """Keyword and shouting heuristic - constant cost, no LLM call."""
+    if URGENT_PATTERN.search(text):
+        return True
+    letters = [c for c in text if c.isalpha()]
+    shouting = len(letters) >= 12 and sum(c.isupper() for c in letters) / len(letters) > 0.7
+    return shouting or text.count("!") >= 3
+
+
+def classify_priority(mention: MentionCreate) -> MentionPriority:
+    """
+    Derives a priority class from the mention source, author metadata
+    (follower count / verified flag) and the urgency heuristic.
+    Each signal bumps the source's base class up one level.
+    """
+    base = settings.ANALYSIS_SOURCE_PRIORITY.get(mention.source or "", MentionPriority.NORMAL.value)
+    level = _PRIORITY_ORDER.index(MentionPriority(base))
+
+    metadata = mention.metadata or {}
+    try:
+        followers = int(metadata.get("follower_count") or metadata.get("followers") or 0)
+    except (TypeError, ValueError):
+        followers = 0
+    if metadata.get("verified") is True or followers >= settings.ANALYSIS_VIP_FOLLOWER_THRESHOLD:
+        level += 1
+    if is_urgent(mention.text):
+        level += 1
+
+    return _PRIORITY_ORDER[min(level, len(_PRIORITY_ORDER) - 1)]
+
+
+class QueueFullError(Exception):
+    """Raised when a mention is refused by admission control."""
+
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+@dataclass
+class AnalysisJob:
+    mention_id: uuid.UUID
+    text: str
+    source: str
+    priority: MentionPriority
+    enqueued_at: float = field(default_factory=time.monotonic)
+
+
+class AnalysisQueue:
+    """
+    In-process analysis queue with one FIFO per priority class.
+
+    Dequeueing is smooth weighted round-robin across the non-empty classes, so
+    high priority is served first most of the time but low priority still progresses.
+    Admission control bounds queue depth, estimated wait and per-source backlog.
+    """
+
+    def __init__(self):
+        self._queues = {priority: deque() for priority in MentionPriority}
+        self._credit = {priority: 0 for priority in MentionPriority}
+        self._per_source = Counter()
+        self._in_flight = 0
+        self._avg_service_time = settings.ANALYSIS_INITIAL_SERVICE_TIME
+        self._not_empty = asyncio.Condition()
+        self._workers: list[asyncio.Task] = []
+        self._closing = False
+
+    def depth(self) -> int:
+        return sum(len(q) for q in self._queues.values())
+
+    def estimated_wait(self, depth: int | None = None) -> float:
+        """Seconds until a newly queued job would start, from the measured service time."""
+        depth = self.depth() + self._in_flight if depth is None else depth
+        return depth * self._avg_service_time / max(settings.ANALYSIS_WORKERS, 1)
+
+    def check_admission(self, source: str | None, priority: MentionPriority) -> None:
+        """
+        Raises QueueFullError (with a Retry-After hint in seconds) if the mention
+        should be refused; otherwise returns None.
+        """
+        if self._closing:
+            raise QueueFullError("Analysis queue is shutting down", retry_after=settings.ANALYSIS_SHUTDOWN_TIMEOUT_SECONDS)
+        source = source or "unknown"
+        depth = self.depth()
+        per_worker = self._avg_service_time / max(settings.ANALYSIS_WORKERS, 1)
+
+        depth_limit = int(settings.ANALYSIS_MAX_QUEUE_DEPTH * _ADMISSION_SHARE[priority])
+        if depth >= depth_limit:
+            raise QueueFullError(
+                f"Analysis queue is full ({depth} queued)",
+                retry_after=max(1, math.ceil((depth - depth_limit + 1) * per_worker)),
+            )
+
+        wait = self.estimated_wait()
+        wait_limit = settings.ANALYSIS_MAX_ESTIMATED_WAIT_SECONDS * _ADMISSION_SHARE[priority]
+        if wait > wait_limit:
+            raise QueueFullError(
+                f"Estimated analysis wait of {wait:.0f}s exceeds limit",
+                retry_after=max(1, math.ceil(wait - wait_limit)),
+            )
+
+        quota = settings.ANALYSIS_SOURCE_QUOTAS.get(source, settings.ANALYSIS_DEFAULT_SOURCE_QUOTA)
+        if self._per_source[source] >= quota:
+            raise QueueFullError(
+                f"Source '{source}' has {self._per_source[source]} mentions queued (quota {quota})",
+                retry_after=max(1, math.ceil((self._per_source[source] - quota + 1) * per_worker)),
+            )
+
+    async def put(self, job: AnalysisJob) -> None:
+        async with self._not_empty:
+            self._queues[job.priority].append(job)
+            self._per_source[job.source] += 1
+            self._not_empty.notify()
+
+    def _pop_weighted(self) -> AnalysisJob:
+        # Smooth weighted round-robin (as in nginx upstreams) over non-empty classes
+        active = [p for p in MentionPriority if self._queues[p]]
+        total = 0
+        for priority in active:
+            weight = settings.ANALYSIS_PRIORITY_WEIGHTS.get(priority.value, 1)
+            self._credit[priority] += weight
+            total += weight
+        chosen = max(active, key=lambda p: self._credit[p])
+        self._credit[chosen] -= total
+        job = self._queues[chosen].popleft()
+        self._per_source[job.source] -= 1
+        if not self._per_source[job.source]:
+            del self._per_source[job.source]
+        return job
+
+    async def get(self) -> AnalysisJob | None:
+        """Next job by weighted priority, or None once the queue is stopping."""
+        async with self._not_empty:
+            await self._not_empty.wait_for(lambda: self._closing or self.depth() > 0)
+            if self._closing:
+                return None
+            return self._pop_weighted()
+
+    async def _worker(
+        self,
+        handler: Callable[[uuid.UUID, str], Awaitable[None]],
+        on_cancel: Callable[[uuid.UUID], Awaitable[None]] | None,
+    ):
+        while True:
+            job = await self.get()
+            if job is None:
+                return
+            self._in_flight += 1
+            started = time.monotonic()
+            try:
+                await handler(job.mention_id, job.text)
+            except asyncio.CancelledError:
+                # Cancelled mid-analysis (shutdown timeout): hand the mention back so it's re-queued on startup
+                logger.warning(f"Analysis of mention {job.mention_id} cancelled; resetting it to pending.")
+                if on_cancel is not None:
+                    try:
+                        await on_cancel(job.mention_id)
+                    except Exception as e:
+                        logger.error(f"Failed to reset cancelled mention {job.mention_id}: {e}")
+                raise
+            except Exception as e:
+                # The handler records failures itself; never let one job kill the worker
+                logger.error(f"Analysis worker error for mention {job.mention_id}: {e}", exc_info=True)
+            finally:
+                self._in_flight -= 1
+                # Exponentially weighted moving average of service time
+                self._avg_service_time = 0.9 * self._avg_service_time + 0.1 * (time.monotonic() - started)
+            logger.info(
+                f"Analysed mention {job.mention_id} (priority={job.priority.value}, "
+                f"queued {started - job.enqueued_at:.1f}s)"
+            )
+
+    def start(
+        self,
+        handler: Callable[[uuid.UUID, str], Awaitable[None]],
+        on_cancel: Callable[[uuid.UUID], Awaitable[None]] | None = None,
+    ) -> None:
+        """
+        Starts ANALYSIS_WORKERS workers that pass each job to handler(mention_id, text).
+        on_cancel(mention_id) is awaited for a job whose handler is cancelled at shutdown.
+        """
+        self._closing = False
+        for i in range(settings.ANALYSIS_WORKERS):
+            self._workers.append(asyncio.create_task(self._worker(handler, on_cancel), name=f"analysis-worker-{i}"))
+        logger.info(f"Started {settings.ANALYSIS_WORKERS} analysis workers.")
+
+    async def stop(self, timeout: float | None = None) -> None:
+        """
+        Stops admitting and dequeueing work, lets in-flight analyses finish for up to
+        timeout seconds (default ANALYSIS_SHUTDOWN_TIMEOUT_SECONDS), then cancels the rest.
+        Mentions still queued stay PENDING in the database and are re-queued on startup.
+        """
+        timeout = settings.ANALYSIS_SHUTDOWN_TIMEOUT_SECONDS if timeout is None else timeout
+        async with self._not_empty:
+            self._closing = True
+            self._not_empty.notify_all()
+        if self._workers:
+            _, still_running = await asyncio.wait(self._workers, timeout=timeout)
+            if still_running:
+                logger.warning(f"Cancelling {len(still_running)} analyses still running after {timeout}s.")
+                for task in still_running:
+                    task.cancel()
+                await asyncio.gather(*still_running, return_exceptions=True)
+        self._workers.clear()
+        logger.info(f"Stopped analysis workers ({self.depth()} mentions left queued).")
+
+
+async def requeue_unfinished(db: AsyncSession, queue: AnalysisQueue) -> int:
+    """
+    Puts PENDING mentions, and PROCESSING ones not touched for ANALYSIS_STALE_PROCESSING_SECONDS,
+    back on the queue after a restart. They were admitted before, so admission control is skipped.
+    """
+    stale_before = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(seconds=settings.ANALYSIS_STALE_PROCESSING_SECONDS)
+    db_mentions = await crud_mentions.get_unfinished_mentions(db, stale_before=stale_before)
+    for db_mention in db_mentions:
+        mention = MentionCreate(
+            text=db_mention.text,
+            source=db_mention.source,
+            metadata=db_mention.metadata_ if isinstance(db_mention.metadata_, dict) else None,
+        )
+        await queue.put(AnalysisJob(
+            mention_id=db_mention.id,
+            text=db_mention.text,
+            source=db_mention.source or "unknown",
+            priority=classify_priority(mention),
+        ))
+    if db_mentions:
+        logger.info(f"Re-queued {len(db_mentions)} unfinished mentions from a previous run.")
+    return len(db_mentions)
+
+
+# Process-wide queue used by the API endpoints and started in the app lifespan
+analysis_queue = AnalysisQueue()
@@ -0,0 +1,48 @@
+# app/services/idempotency.py
+import uuid
+import threading
+from collections import OrderedDict
+from app.core.config import settings
+from app.models.domain.mentions import MentionCreate
+
+
+def derive_idempotency_key(mention: MentionCreate, header_key: str | None = None) -> str | None:
+    """
+    Returns the dedup key for a submission: the Idempotency-Key header if given,
+    otherwise (source, metadata.external_id). None means the mention isn't deduplicated.
+    """
+    if header_key and header_key.strip():
+        return f"key:{header_key.strip()}"
+    external_id = (mention.metadata or {}).get("external_id")
+    if external_id is not None and str(external_id) != "":
+        return f"ext:{mention.source or ''}:{external_id}"
+    return None
+
+
+class IdempotencyCache:
+    """
+    Bounded LRU of idempotency key -> mention ID for recently submitted mentions.
+    Only a fast path: the unique index on mentions.idempotency_key is what enforces it.
+    """
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._entries: OrderedDict[str, uuid.UUID] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> uuid.UUID | None:
+        with self._lock:
+            mention_id = self._entries.get(key)
+            if mention_id is not None:
+                self._entries.move_to_end(key)
+            return mention_id
+
+    def put(self, key: str, mention_id: uuid.UUID) -> None:
+        with self._lock:
+            self._entries[key] = mention_id
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+
+idempotency_cache = IdempotencyCache(settings.IDEMPOTENCY_CACHE_SIZE)
@@ -1,28 +1,27 @@
 # app/services/llm_analyzer.py
-from openai import OpenAI, APIError, RateLimitError, APITimeoutError
 import backoff  # For exponential backoff retries
-from app.core.config import settings, logger
+from app.core.config import logger
 from app.models.domain.mentions import MentionAnalysis
+from app.services.llm_providers import analyze_with_failover, LLMProviderError
+from app.core.profiling import span
 from typing import Type
 
-# Configure OpenAI client (do this once)
-client = OpenAI(api_key=settings.OPENAI_API_KEY)
-
-# Define retry strategy for transient OpenAI errors
+# Providers (OpenAI, local Ollama, ...) are configured in llm_providers via settings.LLM_PROVIDERS.
+# Each call already hedges and fails over across providers, so only retry once all of them failed.
 @backoff.on_exception(backoff.expo,
-                      (RateLimitError, APITimeoutError, APIError),
+                      LLMProviderError,
                       max_tries=3,
                       jitter=backoff.full_jitter)
 def analyze_mention_with_llm(mention_text: str, personality: str = "neutral") -> MentionAnalysis:
     """
-    Analyzes a mention using the configured OpenAI model and returns structured data.
-    Includes retry logic for common transient API errors.
+    Analyzes a mention using the configured LLM providers and returns structured data.
+    Slow primaries are hedged and failing providers are failed over automatically;
+    retries with backoff if every provider failed.
     """
     logger.info(f"Analyzing mention: '{mention_text[:50]}...'")
     try:
-        completion = client.beta.chat.completions.parse(
-            model=settings.OPENAI_MODEL,
-            messages=[
+        with span("llm.call"):
+            analyzed_data = analyze_with_failover(messages=[
                 {"role": "system", "content": f"""
                     Extract structured information from social media mentions about our products.
                     Your persona is {personality}.
@@ -35,17 +34,13 @@ def analyze_mention_with_llm(mention_text: str, personality: str = "neutral") ->
                     - A concise description for a support ticket if the issue requires developer attention (e.g., bug report, feature request).
                 """},
                 {"role": "user", "content": mention_text},
-            ],
-            response_format=MentionAnalysis, # Use the Pydantic model directly
-            temperature=0.2, # Lower temperature for more deterministic analysis
-        )
-        analyzed_data = completion.choices[0].message.parsed
+            ])
         logger.info(f"Analysis complete for mention: '{mention_text[:50]}...'")
         return analyzed_data
 
-    except APIError as e:
-        logger.error(f"OpenAI API Error analyzing mention: {e}", exc_info=True)
-        raise  # Re-raise after logging (backoff will catch specific types)
+    except LLMProviderError as e:
+        logger.error(f"All LLM providers failed analyzing mention: {e}")
+        raise  # Re-raise after logging (backoff will retry)
     except Exception as e:
         logger.error(f"Unexpected error analyzing mention '{mention_text[:50]}...': {e}", exc_info=True)
         # Decide how to handle non-API errors - maybe raise a custom exception
@@ -0,0 +1,170 @@
+# app/services/llm_providers.py
+import time
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from openai import OpenAI
+from app.core.config import settings, logger
+from app.models.domain.mentions import MentionAnalysis
+
+# Shared pool for provider calls, so a hedged request can run alongside the primary.
+# A losing call keeps its thread until it returns or times out, so size for one call per
+# provider per analysis worker, with headroom for those stragglers
+_executor = ThreadPoolExecutor(
+    max_workers=settings.LLM_EXECUTOR_WORKERS or settings.ANALYSIS_WORKERS * len(settings.LLM_PROVIDERS) * 2,
+    thread_name_prefix="llm-provider",
+)
+
+
+class LLMProviderError(Exception):
+    """Raised when no provider returned a valid analysis."""
+
+
+class LLMProvider:
+    """
+    An OpenAI-compatible chat endpoint that returns structured MentionAnalysis data.
+    Output is constrained with a JSON schema derived from the Pydantic model, which
+    works for OpenAI and for local servers exposing the same API (e.g. Ollama's /v1).
+    Also tracks recent latencies and errors for hedging and failover decisions.
+    """
+
+    def __init__(self, name: str, client: OpenAI, model: str):
+        self.name = name
+        self.client = client
+        self.model = model
+        self.latencies = deque(maxlen=200) # Recent successful call durations (seconds)
+        self.unhealthy_until = 0.0
+        self.hedge_losses = 0 # Consecutive requests where a hedge answered before this provider
+        self._lock = threading.Lock()
+
+    def analyze(self, messages: list[dict], temperature: float = 0.2) -> MentionAnalysis:
+        """Runs one structured extraction call and records its outcome."""
+        started = time.perf_counter()
+        try:
+            completion = self.client.beta.chat.completions.parse(
+                model=self.model,
+                messages=messages,
+                response_format=MentionAnalysis, # Sent as a strict json_schema response format
+                temperature=temperature,
+            )
+            analyzed_data = completion.choices[0].message.parsed
+            if analyzed_data is None:
+                raise LLMProviderError(f"Provider '{self.name}' returned no parsable analysis")
+        except Exception:
+            self.unhealthy_until = time.monotonic() + settings.LLM_PROVIDER_COOLDOWN_SECONDS
+            raise
+        self.latencies.append(time.perf_counter() - started)
+        return analyzed_data
+
+    def is_healthy(self) -> bool:
+        return time.monotonic() >= self.unhealthy_until
+
+    def record_hedge_result(self, won: bool) -> None:
+        """
+        Tracks hedge races. A provider that hangs instead of erroring never raises,
+        so LLM_HEDGE_LOSS_LIMIT consecutive losses also put it on cooldown.
+        """
+        with self._lock:
+            if won:
+                self.hedge_losses = 0
+                return
+            self.hedge_losses += 1
+            if self.hedge_losses >= settings.LLM_HEDGE_LOSS_LIMIT:
+                self.hedge_losses = 0
+                self.unhealthy_until = time.monotonic() + settings.LLM_PROVIDER_COOLDOWN_SECONDS
+                logger.warning(f"Provider '{self.name}' lost {settings.LLM_HEDGE_LOSS_LIMIT} hedges in a row, cooling down.")
+
+    def hedge_delay(self) -> float:
+        """Seconds to wait on this provider before hedging: the configured latency percentile."""
+        samples = sorted(self.latencies)
+        if len(samples) < settings.LLM_HEDGE_MIN_SAMPLES:
+            return settings.LLM_HEDGE_DEFAULT_DELAY
+        index = min(len(samples) - 1, int(len(samples) * settings.LLM_HEDGE_PERCENTILE / 100))
+        return samples[index]
+
+
+def _build_provider(name: str) -> LLMProvider:
+    if name == "openai":
+        client = OpenAI(api_key=settings.OPENAI_API_KEY, timeout=settings.LLM_REQUEST_TIMEOUT, max_retries=0)
+        return LLMProvider(name, client, settings.OPENAI_MODEL)
+    if name == "ollama":
+        # Ollama ignores the API key, but the OpenAI client requires one
+        client = OpenAI(base_url=settings.OLLAMA_BASE_URL, api_key="ollama", timeout=settings.LLM_REQUEST_TIMEOUT, max_retries=0)
+        return LLMProvider(name, client, settings.OLLAMA_MODEL)
+    raise ValueError(f"Unknown LLM provider: '{name}'")
+
+
+_providers: list[LLMProvider] | None = None
+_providers_lock = threading.Lock()
+
+def get_providers() -> list[LLMProvider]:
+    """Returns the configured providers (created once per process), in preference order."""
+    global _providers
+    with _providers_lock:
+        if _providers is None:
+            _providers = [_build_provider(name) for name in settings.LLM_PROVIDERS]
+            logger.info(f"LLM providers configured: {[p.name for p in _providers]}")
+    return _providers
+
+
+def analyze_with_failover(messages: list[dict]) -> MentionAnalysis:
+    """
+    Sends the request to the preferred provider and returns the first valid answer.
+
+    - Hedging: if the in-flight provider hasn't answered within its latency percentile,
+      the same request is also sent to the next provider.
+    - Failover: if a provider errors, the next one is tried straight away.
+    Providers that recently errored are tried last.
+
+    Raises:
+        LLMProviderError: If every provider failed.
+    """
+    providers = get_providers()
+    chain = [p for p in providers if p.is_healthy()] + [p for p in providers if not p.is_healthy()]
+    pending = {}
+    errors = []
+    next_idx = 0
+
+    def launch():
+        nonlocal next_idx
+        provider = chain[next_idx]
+        next_idx += 1
+        pending[_executor.submit(provider.analyze, messages)] = provider
+        return provider
+
+    primary = launch()
+    while pending:
+        timeout = None
+        in_flight = next(iter(pending.values()))
+        if settings.LLM_HEDGING_ENABLED and len(pending) == 1 and next_idx < len(chain):
+            timeout = in_flight.hedge_delay()
+
+        done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+        if not done:
+            hedge = launch()
+            logger.warning(f"Provider '{in_flight.name}' slower than {timeout:.2f}s, hedging with '{hedge.name}'")
+            continue
+
+        for future in done:
+            provider = pending.pop(future)
+            try:
+                result = future.result()
+            except Exception as e:
+                logger.error(f"Provider '{provider.name}' failed: {e}")
+                errors.append(f"{provider.name}: {e}")
+                continue
+            if provider is not primary:
+                logger.info(f"Analysis served by secondary provider '{provider.name}'")
+            if pending:
+                # A hedge race: the winner is healthy, the providers still running lost it
+                provider.record_hedge_result(won=True)
+                for loser_future, loser in pending.items():
+                    loser.record_hedge_result(won=False)
+                    loser_future.cancel() # Frees the slot if the call hasn't started yet
+            return result
+
+        if not pending and next_idx < len(chain):
+            failover = launch()
+            logger.warning(f"Failing over to provider '{failover.name}'")
+
+    raise LLMProviderError(f"All LLM providers failed: {'; '.join(errors)}")
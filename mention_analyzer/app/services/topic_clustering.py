@@ -0,0 +1,197 @@
+# app/services/topic_clustering.py
+import re
+import math
+import time
+import uuid
+import zlib
+import datetime
+from collections import Counter
+from dataclasses import dataclass, field
+import numpy as np
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.config import settings, logger
+from app.models.domain.mentions import MentionAnalysis
+from app.db.crud import mentions as crud_mentions
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9']+")
+STOPWORDS = frozenset("""
+    a an and are as at be but by for from has have i i'm is it it's its me my of on or our so that the
+    this to was we were what when with you your just can not no they them there their been do does
+""".split())
+
+LN2 = math.log(2)
+
+
+def tokenize(text: str) -> list[str]:
+    """Lowercased word unigrams and bigrams, without stopwords."""
+    words = [w for w in TOKEN_PATTERN.findall(text.lower()) if len(w) > 2 and w not in STOPWORDS]
+    return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+
+def _decay(count: float, elapsed: float, half_life: float) -> float:
+    return count * 2 ** (-elapsed / half_life)
+
+
+@dataclass
+class _Cluster:
+    id: int
+    vector_sum: np.ndarray
+    first_seen: float
+    last_seen: float
+    size: int = 0
+    fast_count: float = 0.0 # Exponentially decayed counts, used for growth rate
+    slow_count: float = 0.0
+    terms: Counter = field(default_factory=Counter)
+    sentiments: Counter = field(default_factory=Counter)
+    representatives: list = field(default_factory=list) # (similarity, mention_id, text), best first
+
+    def rates(self, now: float) -> tuple[float, float]:
+        """Recent and baseline arrival rates in mentions/hour."""
+        fast = _decay(self.fast_count, now - self.last_seen, settings.CLUSTER_FAST_HALF_LIFE_SECONDS)
+        slow = _decay(self.slow_count, now - self.last_seen, settings.CLUSTER_SLOW_HALF_LIFE_SECONDS)
+        return (fast * LN2 / settings.CLUSTER_FAST_HALF_LIFE_SECONDS * 3600,
+                slow * LN2 / settings.CLUSTER_SLOW_HALF_LIFE_SECONDS * 3600)
+
+
+class TopicClusterer:
+    """
+    Incremental (leader-follower / online spherical k-means) clustering of analysed mentions.
+
+    Each mention becomes a hashed TF-IDF vector (IDF estimated online) and is assigned
+    to the most similar centroid if the cosine similarity clears the threshold, otherwise
+    it starts a new cluster. With at most CLUSTER_MAX_CLUSTERS centroids, each assignment
+    is a single fixed-size matrix-vector product, independent of how many mentions were seen.
+    Per-cluster decayed counts over a short and a long half-life give its growth rate.
+    """
+
+    def __init__(self):
+        self.dim = settings.CLUSTER_FEATURE_DIM
+        self.max_clusters = settings.CLUSTER_MAX_CLUSTERS
+        self._centroids = np.zeros((self.max_clusters, self.dim), dtype=np.float32) # Unit rows
+        self._slots: list[_Cluster | None] = [None] * self.max_clusters
+        self._doc_freq = np.zeros(self.dim, dtype=np.float32)
+        self._n_docs = 0
+        self._next_id = 1
+
+    def _vectorize(self, tokens: list[str]) -> np.ndarray:
+        vec = np.zeros(self.dim, dtype=np.float32)
+        buckets = np.fromiter((zlib.crc32(t.encode()) % self.dim for t in tokens), dtype=np.int64, count=len(tokens))
+        np.add.at(vec, buckets, 1.0)
+        present = vec > 0
+        self._doc_freq[present] += 1
+        self._n_docs += 1
+        vec[present] = (1 + np.log(vec[present])) * (np.log((1 + self._n_docs) / (1 + self._doc_freq[present])) + 1)
+        norm = np.linalg.norm(vec)
+        return vec / norm if norm else vec
+
+    def _evict_slot(self, now: float) -> int:
+        """Frees the slot of the least active cluster (stale or tiny), counting recent and baseline activity."""
+        victim = min(
+            (c for c in self._slots if c is not None),
+            key=lambda c: _decay(c.fast_count, now - c.last_seen, settings.CLUSTER_FAST_HALF_LIFE_SECONDS)
+                        + _decay(c.slow_count, now - c.last_seen, settings.CLUSTER_SLOW_HALF_LIFE_SECONDS),
+        )
+        slot = self._slots.index(victim)
+        self._slots[slot] = None
+        self._centroids[slot] = 0
+        return slot
+
+    def add(self, mention_id: uuid.UUID, text: str, analysis: MentionAnalysis | None = None, timestamp: float | None = None) -> int | None:
+        """Assigns a completed mention to a cluster and returns the cluster ID (None if it has no usable words)."""
+        now = time.time() if timestamp is None else timestamp
+        # The support ticket description is the model's summary of the issue, so weight it in
+        content = text
+        if analysis is not None and analysis.support_ticket_description:
+            content = f"{text} {analysis.support_ticket_description}"
+        tokens = tokenize(content)
+        if not tokens:
+            return None
+        vec = self._vectorize(tokens)
+
+        sims = self._centroids @ vec
+        slot = int(np.argmax(sims))
+        similarity = float(sims[slot])
+        if self._slots[slot] is None or similarity < settings.CLUSTER_SIMILARITY_THRESHOLD:
+            free = next((i for i, c in enumerate(self._slots) if c is None), None)
+            slot = free if free is not None else self._evict_slot(now)
+            self._slots[slot] = _Cluster(id=self._next_id, vector_sum=np.zeros(self.dim, dtype=np.float32), first_seen=now, last_seen=now)
+            self._next_id += 1
+            similarity = 1.0
+
+        cluster = self._slots[slot]
+        elapsed = max(now - cluster.last_seen, 0.0)
+        cluster.fast_count = _decay(cluster.fast_count, elapsed, settings.CLUSTER_FAST_HALF_LIFE_SECONDS) + 1
+        cluster.slow_count = _decay(cluster.slow_count, elapsed, settings.CLUSTER_SLOW_HALF_LIFE_SECONDS) + 1
+        cluster.last_seen = max(now, cluster.last_seen)
+        cluster.size += 1
+
+        cluster.vector_sum += vec
+        norm = np.linalg.norm(cluster.vector_sum)
+        if norm:
+            self._centroids[slot] = cluster.vector_sum / norm
+
+        cluster.terms.update(t for t in tokens if " " not in t)
+        if len(cluster.terms) > 200: # Keep the term counter bounded
+            cluster.terms = Counter(dict(cluster.terms.most_common(100)))
+        if analysis is not None:
+            cluster.sentiments[analysis.sentiment] += 1
+
+        cluster.representatives.append((similarity, mention_id, text[:280]))
+        cluster.representatives.sort(key=lambda r: r[0], reverse=True)
+        del cluster.representatives[settings.CLUSTER_REPRESENTATIVES:]
+        return cluster.id
+
+    def top_emerging(self, limit: int = 10, min_size: int | None = None) -> list[dict]:
+        """
+        Clusters ranked by how far their recent rate exceeds their baseline rate,
+        i.e. the incidents that are growing fastest right now.
+        """
+        now = time.time()
+        min_size = settings.CLUSTER_MIN_SIZE if min_size is None else min_size
+        ranked = []
+        for cluster in self._slots:
+            if cluster is None or cluster.size < min_size:
+                continue
+            recent_rate, baseline_rate = cluster.rates(now)
+            ranked.append((recent_rate - baseline_rate, recent_rate, baseline_rate, cluster))
+        ranked.sort(key=lambda r: r[0], reverse=True)
+
+        return [
+            {
+                "id": cluster.id,
+                "size": cluster.size,
+                "recent_rate_per_hour": round(recent_rate, 2),
+                "baseline_rate_per_hour": round(baseline_rate, 2),
+                "growth": round(recent_rate / baseline_rate, 2) if baseline_rate else 0.0,
+                "top_terms": [term for term, _ in cluster.terms.most_common(8)],
+                "by_sentiment": dict(cluster.sentiments),
+                "first_seen": datetime.datetime.fromtimestamp(cluster.first_seen, datetime.timezone.utc),
+                "last_seen": datetime.datetime.fromtimestamp(cluster.last_seen, datetime.timezone.utc),
+                "representative_mentions": [
+                    {"id": mention_id, "text": text, "similarity": round(similarity, 3)}
+                    for similarity, mention_id, text in cluster.representatives
+                ],
+            }
+            for _, recent_rate, baseline_rate, cluster in ranked[:limit]
+        ]
+
+
+async def warm_start(db: AsyncSession, clusterer: TopicClusterer) -> None:
+    """Rebuilds clusters from recently completed mentions, oldest first, so growth rates survive a restart."""
+    db_mentions = await crud_mentions.get_recent_completed_mentions(db, limit=settings.CLUSTER_WARM_START_LIMIT)
+    for db_mention in reversed(db_mentions):
+        analysis = None
+        if isinstance(db_mention.analysis_result, dict):
+            try:
+                analysis = MentionAnalysis.model_validate(db_mention.analysis_result)
+            except ValueError:
+                pass
+        updated_at = db_mention.updated_at or db_mention.created_at
+        if updated_at is not None and updated_at.tzinfo is None:
+            updated_at = updated_at.replace(tzinfo=datetime.timezone.utc) # SQLite drops the timezone
+        clusterer.add(db_mention.id, db_mention.text, analysis, timestamp=updated_at.timestamp() if updated_at else None)
+    logger.info(f"Topic clusters warmed from {len(db_mentions)} completed mentions.")
+
+
+# Process-wide clusterer fed by the analysis workers
+topic_clusterer = TopicClusterer()
@@ -1,6 +1,29 @@
 import chainlit as cl
 from ollama import AsyncClient
 import re
+import time
+
+OLLAMA_HOST = 'http://localhost:11434'
+MODEL = 'deepseek-r1:8b'
+SYSTEM_PROMPT = "Think step-by-step using <think></think> tags"
+
+THINK_OPEN = "<think>"
+THINK_CLOSE = "</think>"
+# Matched against the original text: str.lower() can change a string's length (e.g. 'İ'), shifting offsets
+TAG_PATTERNS = {tag: re.compile(re.escape(tag), re.IGNORECASE) for tag in (THINK_OPEN, THINK_CLOSE)}
+
+FLUSH_CHARS = 64          # Stream visible text to the UI in batches of at least this many chars
+FLUSH_INTERVAL = 0.05     # ...or at least this often (seconds), whichever comes first
+HISTORY_TOKEN_BUDGET = 2048  # Approximate token budget for prior turns sent with each prompt
+
+_client: AsyncClient | None = None
+
+def get_client() -> AsyncClient:
+    """Return the process-wide Ollama client, creating it on first use"""
+    global _client
+    if _client is None:
+        _client = AsyncClient(host=OLLAMA_HOST)
+    return _client
 
 def process_thoughts(response: str):
     """Extract and format thinking patterns"""
@@ -8,12 +31,84 @@ def process_thoughts(response: str):
     cleaned_response = re.sub(r'<think>.*?</think>', '', response, flags=re.DOTALL | re.IGNORECASE)
     return cleaned_response.strip(), thoughts
 
+def _partial_tag_suffix(text: str, tag: str) -> int:
+    """Length of the longest suffix of text that is a proper prefix of tag"""
+    for size in range(min(len(text), len(tag) - 1), 0, -1):
+        # Compare character by character so offsets stay those of the original text
+        if all(c.lower() == t for c, t in zip(text[-size:], tag)):
+            return size
+    return 0
+
+class ThinkTagParser:
+    """
+    Incrementally splits streamed chunks into visible text and thought text.
+    Only <think> and </think> are treated as tags; any other '<' is plain text.
+    A tag split across chunk boundaries is held back until it can be decided.
+    """
+
+    def __init__(self):
+        self.in_thought = False
+        self._pending = ""
+
+    def feed(self, chunk: str) -> list[tuple[str, str]]:
+        """
+        Returns a list of (kind, value) events, where kind is 'text', 'thought',
+        'open' or 'close'. 'text' and 'thought' values are the raw content.
+        """
+        events = []
+        data = self._pending + chunk
+        self._pending = ""
+        while data:
+            tag = THINK_CLOSE if self.in_thought else THINK_OPEN
+            kind = "thought" if self.in_thought else "text"
+            match = TAG_PATTERNS[tag].search(data)
+            if match:
+                if match.start():
+                    events.append((kind, data[:match.start()]))
+                events.append(("close" if self.in_thought else "open", ""))
+                self.in_thought = not self.in_thought
+                data = data[match.end():]
+                continue
+            keep = _partial_tag_suffix(data, tag)
+            if keep:
+                self._pending = data[-keep:]
+                data = data[:-keep]
+            if data:
+                events.append((kind, data))
+            break
+        return events
+
+    def flush(self) -> list[tuple[str, str]]:
+        """Emit whatever is still held back once the stream has ended"""
+        pending, self._pending = self._pending, ""
+        if not pending:
+            return []
+        return [("thought" if self.in_thought else "text", pending)]
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (~4 chars per token) - good enough for budgeting"""
+    return len(text) // 4 + 1
+
+def trim_history(history: list[dict], budget: int = HISTORY_TOKEN_BUDGET) -> list[dict]:
+    """Keep the most recent whole user/assistant turns that fit within the token budget"""
+    kept = []
+    used = 0
+    for i in range(len(history) - 1, -1, -2):
+        turn = history[max(i - 1, 0):i + 1]
+        cost = sum(estimate_tokens(m["content"]) for m in turn)
+        if used + cost > budget:
+            break
+        kept[:0] = turn
+        used += cost
+    return kept
+
 @cl.on_chat_start
 async def start_chat():
     app_user = cl.user_session.get("user")
     await cl.Message(f"Hello {app_user.identifier}").send()
     print(f"User {app_user.identifier} has started a chat session.")
     cl.user_session.set("show_thoughts", False)  # Toggle for thought visibility
+    cl.user_session.set("history", [])
 
 @cl.on_message
 async def main(message: cl.Message):
@@ -21,19 +116,27 @@ async def main(message: cl.Message):
     response = cl.Message(content="")
     await response.send()
 
-    # Prepare messages with history
-    messages = [{"role": "system", "content": "Think step-by-step using <think></think> tags"}]
-    messages.extend(cl.user_session.get("history", []))
+    # Prepare messages with (budget-trimmed) history
+    history = trim_history(cl.user_session.get("history", []))
+    messages = [{"role": "system", "content": SYSTEM_PROMPT}]
+    messages.extend(history)
     messages.append({"role": "user", "content": message.content})
 
     # Initialize variables
     full_response = ""
-    current_thought = ""
-    in_thought = False
+    parser = ThinkTagParser()
+    thinking_msg = None
+    buffer = ""
+    last_flush = time.perf_counter()
 
-    client = AsyncClient(host='http://localhost:11434')
-    async for chunk in await client.chat(
-        model='deepseek-r1:8b',
+    started = time.perf_counter()
+    first_token_at = None
+    chunk_count = 0
+    eval_count = None
+    eval_duration = None
+
+    async for chunk in await get_client().chat(
+        model=MODEL,
         messages=messages,
         stream=True,
         options={
@@ -42,41 +145,64 @@ async def main(message: cl.Message):
         }
     ):
         content = chunk['message']['content']
+        if chunk.get('done'):
+            eval_count = chunk.get('eval_count')
+            eval_duration = chunk.get('eval_duration')
+        if not content:
+            continue
+        if first_token_at is None:
+            first_token_at = time.perf_counter()
+        chunk_count += 1
         full_response += content
-        
+
         # Handle thought tags in stream
-        for char in content:
-            if char == "<":
-                in_thought = True
-                current_thought = ""
-            elif char == ">" and in_thought:
-                in_thought = False
-                if current_thought.lower().startswith("think"):
-                    # Start thought processing
-                    await cl.Message(
-                        content="Thinking ...🤔",
-                        author="Thinking",
-                        parent_id=response.id
-                    ).send()
-                elif current_thought.lower().startswith("/think"):
-                    # End thought processing
-                    await cl.Message(
-                        content="",
-                        author="Thinking",
-                        parent_id=response.id
-                    ).remove()
-            elif in_thought:
-                current_thought += char
-            else:
-                await response.stream_token(char)
+        for kind, value in parser.feed(content):
+            if kind == "text":
+                buffer += value
+            elif kind == "open":
+                thinking_msg = cl.Message(
+                    content="Thinking ...🤔",
+                    author="Thinking",
+                    parent_id=response.id
+                )
+                await thinking_msg.send()
+            elif kind == "close" and thinking_msg is not None:
+                await thinking_msg.remove()
+                thinking_msg = None
+
+        now = time.perf_counter()
+        if buffer and (len(buffer) >= FLUSH_CHARS or now - last_flush >= FLUSH_INTERVAL):
+            await response.stream_token(buffer)
+            buffer = ""
+            last_flush = now
+
+    for kind, value in parser.flush():
+        if kind == "text":
+            buffer += value
+    if buffer:
+        await response.stream_token(buffer)
+    if thinking_msg is not None:
+        await thinking_msg.remove()
 
     # Final processing
     cleaned_response, thoughts = process_thoughts(full_response)
-    
+
     # Update final response
     response.content = cleaned_response
     await response.update()
 
+    # Report latency / throughput for this reply
+    finished = time.perf_counter()
+    ttft = (first_token_at or finished) - started
+    if eval_count and eval_duration:
+        tokens_per_sec = eval_count / (eval_duration / 1e9)  # Ollama reports durations in ns
+    else:
+        gen_time = finished - (first_token_at or finished)
+        tokens_per_sec = chunk_count / gen_time if gen_time > 0 else 0.0
+    stats = f"TTFT {ttft:.2f}s · {tokens_per_sec:.1f} tokens/s"
+    print(f"Reply stats: {stats}")
+    await cl.Message(content=stats, author="Stats", parent_id=response.id).send()
+
     # Add thoughts as expandable sections
     if thoughts and cl.user_session.get("show_thoughts"):
         with cl.Sidebar(title="Internal Thoughts"):
@@ -84,11 +210,12 @@ async def main(message: cl.Message):
                 with cl.Accordion(f"Thought Process #{i}", collapsed=True):
                     cl.Text(content=thought.strip(), display="inline")
 
-    # Update history
-    cl.user_session.set("history", messages + [
-        {"role": "assistant", "content": full_response}
-    ])
+    # Update history (without the system prompt or thoughts, which only cost prompt tokens)
+    cl.user_session.set("history", trim_history(history + [
+        {"role": "user", "content": message.content},
+        {"role": "assistant", "content": cleaned_response}
+    ]))
 
 @cl.password_auth_callback
 def auth():
-    return cl.User(identifier="admin")
\ No newline at end of file
+    return cl.User(identifier="admin")